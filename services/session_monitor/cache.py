@@ -0,0 +1,221 @@
+"""Local response caches for LLM calls made by the Session Monitor Service."""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+from .config import SKILL_CACHE_PATH, SUMMARY_CACHE_PATH, SUMMARY_CACHE_SIMILARITY
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# EMBEDDING_MODEL truncates input at 256 word pieces; chunks of this many
+# words stay under that, so a long answer is embedded in full
+_EMBED_CHUNK_WORDS = 150
+
+# How stored embeddings were made; part of each row's index scope, so
+# embeddings made any other way are never compared against
+_EMBEDDING_SCHEME = f"{EMBEDDING_MODEL}:user-turns"
+
+# Summary fields stamped per processing run; they don't change the skill
+_SKILL_KEY_IGNORED_FIELDS = frozenset({"processed_at"})
+
+
+class SummaryCache:
+    """
+    Two-tier cache of Gemini summaries keyed by conversation text.
+
+    Entries are scoped to the model and prompt/schema version that produced
+    them (see GeminiSummarizer), so a summary is only served back to the
+    same configuration.
+
+    1. Exact: SHA-256 of the scope and conversation text, looked up in SQLite.
+    2. Semantic: cosine similarity against previously cached conversations in
+       the same scope. Only the employee's turns are embedded (the
+       interviewer's script is much the same in every session), in chunks
+       that fit the model's input, mean-pooled. Off by default: it needs a
+       similarity_threshold above 0 and sentence-transformers (and numpy)
+       installed; otherwise the cache is exact-match only.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH, similarity_threshold: float = SUMMARY_CACHE_SIMILARITY):
+        self.path = path
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            "hash TEXT PRIMARY KEY, scope TEXT, embedding BLOB, data BLOB NOT NULL, "
+            "created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(summaries)")}
+        if "scope" not in columns:
+            # Cache file from before entries were scoped; its rows never match again
+            self._conn.execute("ALTER TABLE summaries ADD COLUMN scope TEXT")
+        self._conn.commit()
+
+        self._encoder = None
+        self._np = None
+        # Per scope: (hashes, embedding matrix), rows in the same order
+        self._indexes: Dict[str, Tuple[List[str], object]] = {}
+        if similarity_threshold > 0:
+            self._init_semantic()
+
+    def _init_semantic(self):
+        """Load the embedding model and existing embeddings, if available."""
+        try:
+            import numpy as np
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            logger.info("sentence-transformers not installed, summary cache is exact-match only")
+            return
+
+        try:
+            self._encoder = SentenceTransformer(EMBEDDING_MODEL)
+            self._np = np
+            rows = self._conn.execute(
+                "SELECT scope, hash, embedding FROM summaries WHERE embedding IS NOT NULL AND scope IS NOT NULL"
+            ).fetchall()
+            for scope, key, embedding in rows:
+                self._add_to_index(scope, key, np.frombuffer(embedding, dtype=np.float32))
+            logger.info(f"Loaded {len(rows)} summary embeddings for semantic cache")
+        except Exception as e:
+            logger.warning(f"Failed to initialize semantic summary cache: {e}")
+            self._encoder = None
+
+    @staticmethod
+    def _hash(scope: str, text: str) -> str:
+        return hashlib.sha256(f"{scope}\0{text}".encode()).hexdigest()
+
+    def _embed(self, text: str):
+        """Embed text as a normalized float32 vector (None if text is empty)."""
+        words = text.split()
+        if not words:
+            return None
+        chunks = [
+            " ".join(words[start:start + _EMBED_CHUNK_WORDS])
+            for start in range(0, len(words), _EMBED_CHUNK_WORDS)
+        ]
+        pooled = self._encoder.encode(chunks, normalize_embeddings=True).mean(axis=0)
+        return (pooled / self._np.linalg.norm(pooled)).astype(self._np.float32)
+
+    @staticmethod
+    def _index_scope(scope: str) -> str:
+        return f"{_EMBEDDING_SCHEME}|{scope}"
+
+    def _add_to_index(self, scope: str, key: str, embedding):
+        """Add an embedding to scope's semantic index, once per key."""
+        hashes, index = self._indexes.get(scope, ([], None))
+        if key in hashes:
+            return
+        index = embedding[None, :] if index is None else self._np.vstack([index, embedding])
+        self._indexes[scope] = (hashes + [key], index)
+
+    def _fetch(self, key: str) -> Optional[dict]:
+        row = self._conn.execute("SELECT data FROM summaries WHERE hash = ?", (key,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def get(self, conversation_text: str, user_text: str, scope: str) -> Optional[dict]:
+        """
+        Return the cached summary JSON for a conversation in scope, or None.
+
+        user_text is the employee's side of the conversation, used for the
+        semantic lookup.
+        """
+        key = self._hash(scope, conversation_text)
+        index_scope = self._index_scope(scope)
+        with self._lock:
+            data = self._fetch(key)
+            if data is not None:
+                logger.info("Summary cache hit (exact)")
+                return data
+
+            if self._encoder is None or index_scope not in self._indexes:
+                return None
+
+            embedding = self._embed(user_text)
+            if embedding is None:
+                return None
+            hashes, index = self._indexes[index_scope]
+            scores = index @ embedding
+            best = int(scores.argmax())
+            if scores[best] >= self.similarity_threshold:
+                logger.info(f"Summary cache hit (semantic, score={scores[best]:.3f})")
+                return self._fetch(hashes[best])
+
+        return None
+
+    def put(self, conversation_text: str, user_text: str, scope: str, data: dict):
+        """Cache the summary JSON produced for a conversation in scope."""
+        key = self._hash(scope, conversation_text)
+        index_scope = self._index_scope(scope)
+        with self._lock:
+            embedding = self._embed(user_text) if self._encoder is not None else None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (hash, scope, embedding, data) VALUES (?, ?, ?, ?)",
+                (key, index_scope, embedding.tobytes() if embedding is not None else None, orjson.dumps(data))
+            )
+            self._conn.commit()
+            if embedding is not None:
+                self._add_to_index(index_scope, key, embedding)
+
+
+class SkillCache:
+    """
+    Cache of generated skill files keyed by the exact generation inputs.
+
+    The key is a BLAKE2b hash of the canonical JSON of the summary and
+    workflows, plus the model that generated the skill. Per-run fields such
+    as processed_at are left out so a re-run of the same session hits.
+    """
+
+    def __init__(self, path: str = SKILL_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS skills ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, "
+            "created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(summary: dict, workflows: list, model: str) -> str:
+        """Hash the generation inputs; key order in the JSON doesn't matter."""
+        if summary:
+            summary = {k: v for k, v in summary.items() if k not in _SKILL_KEY_IGNORED_FIELDS}
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(orjson.dumps(summary, option=orjson.OPT_SORT_KEYS))
+        digest.update(b"|")
+        digest.update(orjson.dumps(workflows, option=orjson.OPT_SORT_KEYS))
+        digest.update(b"|")
+        digest.update(model.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached skill content for a key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM skills WHERE key = ?", (key,)).fetchone()
+        if row:
+            logger.info("Skill cache hit")
+        return row[0] if row else None
+
+    def put(self, key: str, content: str):
+        """Cache the skill content generated for a key."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO skills (key, content) VALUES (?, ?)",
+                (key, content)
+            )
+            self._conn.commit()
@@ -0,0 +1,62 @@
+"""Process-wide API clients for the Session Monitor Service.
+
+Clients are created lazily on first use and shared by every SessionMonitor
+and StateManager in the process, so credential resolution, channel setup and
+model configuration happen once rather than per request.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_singletons: Dict[str, object] = {}
+# Reentrant so a factory can fetch another shared client (the summarizer needs the rate limiter)
+_lock = threading.RLock()
+
+
+def _get_or_create(name: str, factory: Callable[[], T]) -> T:
+    """Return the shared client registered under name, creating it on first use."""
+    client = _singletons.get(name)
+    if client is None:
+        with _lock:
+            client = _singletons.get(name)
+            if client is None:
+                client = factory()
+                _singletons[name] = client
+    return client
+
+
+def get_storage_client():
+    """Get the shared Google Cloud Storage client."""
+    def factory():
+        from google.cloud import storage
+        return storage.Client()
+    return _get_or_create("storage", factory)
+
+
+def get_napster_client():
+    """Get the shared Napster Spaces API client."""
+    from .napster_client import NapsterSpacesClient
+    return _get_or_create("napster", NapsterSpacesClient)
+
+
+def get_gemini_rate_limiter():
+    """Get the shared Gemini rate limiter."""
+    from .rate_limiter import GeminiRateLimiter
+    return _get_or_create("gemini_rate_limiter", GeminiRateLimiter)
+
+
+def get_summarizer():
+    """Get the shared Gemini summarizer."""
+    from .summarizer import GeminiSummarizer
+    return _get_or_create("summarizer", GeminiSummarizer)
+
+
+def get_skill_generator():
+    """Get the shared skill generator."""
+    from .skill_generator import SkillGenerator
+    return _get_or_create("skill_generator", SkillGenerator)
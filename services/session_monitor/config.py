@@ -2,6 +2,7 @@
 
 import os
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +10,22 @@ logger = logging.getLogger(__name__)
 # Secret Management
 # =============================================================================
 
+# Secret Manager client is created once per process so its gRPC channel is reused
+_SM_CLIENT = None
+_SM_LOCK = threading.Lock()
+
+
+def _get_secret_manager_client():
+    """Get the shared Secret Manager client, creating it on first use."""
+    global _SM_CLIENT
+    if _SM_CLIENT is None:
+        with _SM_LOCK:
+            if _SM_CLIENT is None:
+                from google.cloud import secretmanager
+                _SM_CLIENT = secretmanager.SecretManagerServiceClient()
+    return _SM_CLIENT
+
+
 def _get_secret(secret_id: str, env_var: str = None) -> str:
     """Get a secret from environment variable or Secret Manager."""
     if env_var:
@@ -20,8 +37,7 @@ def _get_secret(secret_id: str, env_var: str = None) -> str:
     project_id = os.environ.get("GCP_PROJECT_ID") or os.environ.get("GOOGLE_CLOUD_PROJECT")
     if project_id:
         try:
-            from google.cloud import secretmanager
-            client = secretmanager.SecretManagerServiceClient()
+            client = _get_secret_manager_client()
             name = f"projects/{project_id}/secrets/{secret_id}/versions/latest"
             response = client.access_secret_version(request={"name": name})
             return response.payload.data.decode("UTF-8")
@@ -59,21 +75,26 @@ def get_gemini_api_key() -> str:
 
 
 class Secrets:
-    """Lazy-loaded secrets."""
+    """Lazy-loaded secrets, fetched at most once per process."""
     _napster_api_key = None
     _gemini_api_key = None
+    _lock = threading.Lock()
 
     @property
     def NAPSTER_API_KEY(self) -> str:
-        if self._napster_api_key is None:
-            self._napster_api_key = get_napster_api_key()
-        return self._napster_api_key
+        if Secrets._napster_api_key is None:
+            with Secrets._lock:
+                if Secrets._napster_api_key is None:
+                    Secrets._napster_api_key = get_napster_api_key()
+        return Secrets._napster_api_key
 
     @property
     def GEMINI_API_KEY(self) -> str:
-        if self._gemini_api_key is None:
-            self._gemini_api_key = get_gemini_api_key()
-        return self._gemini_api_key
+        if Secrets._gemini_api_key is None:
+            with Secrets._lock:
+                if Secrets._gemini_api_key is None:
+                    Secrets._gemini_api_key = get_gemini_api_key()
+        return Secrets._gemini_api_key
 
 
 secrets = Secrets()
@@ -85,10 +106,37 @@ secrets = Secrets()
 
 CHECK_INTERVAL_SECONDS = int(os.environ.get("CHECK_INTERVAL_SECONDS", "300"))  # 5 minutes
 PROCESSED_SESSIONS_FILE = os.environ.get("PROCESSED_SESSIONS_FILE", "/tmp/processed_sessions.json")
+MAX_CONCURRENT_SESSIONS = int(os.environ.get("MAX_CONCURRENT_SESSIONS", "16"))  # Sessions processed in parallel
+WORKER_THREADS = int(os.environ.get("WORKER_THREADS", "32"))  # Threads for blocking API/GCS calls
+STATE_FLUSH_EVERY_N = int(os.environ.get("STATE_FLUSH_EVERY_N", "50"))  # Save state after this many new sessions...
+STATE_FLUSH_INTERVAL_SECONDS = float(os.environ.get("STATE_FLUSH_INTERVAL_SECONDS", "30"))  # ...or this long since the last save
+
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))  # Gemini/Claude requests in flight at once
+SUMMARY_BATCH_SIZE = int(os.environ.get("SUMMARY_BATCH_SIZE", "5"))  # Transcripts per Gemini summary request
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "1000"))  # Gemini requests per minute (0 = unlimited)
+GEMINI_TPM = int(os.environ.get("GEMINI_TPM", "1000000"))  # Estimated Gemini input tokens per minute (0 = unlimited)
+GEMINI_MAX_WAIT_SECONDS = float(os.environ.get("GEMINI_MAX_WAIT_SECONDS", "60"))  # Longest wait for capacity before giving up
+
+# Model routing: short, simple transcripts and thin summaries go to cheaper models
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "gemini-2.5-flash")
+SUMMARY_LIGHT_MODEL = os.environ.get("SUMMARY_LIGHT_MODEL", "gemini-2.5-flash-lite")
+SUMMARY_LIGHT_MAX_CHARS = int(os.environ.get("SUMMARY_LIGHT_MAX_CHARS", "4000"))  # Longer transcripts use SUMMARY_MODEL
+SUMMARY_LIGHT_MAX_TURNS = int(os.environ.get("SUMMARY_LIGHT_MAX_TURNS", "10"))  # More entries use SUMMARY_MODEL
+SKILL_MODEL = os.environ.get("SKILL_MODEL", "claude-opus-4-6")
+SKILL_LIGHT_MODEL = os.environ.get("SKILL_LIGHT_MODEL", "claude-sonnet-4-5@20250929")  # Empty disables routing
+SKILL_LIGHT_MAX_WORKFLOWS = int(os.environ.get("SKILL_LIGHT_MAX_WORKFLOWS", "2"))  # More workflows use SKILL_MODEL
+
+# Local cache of Gemini summaries (empty path disables it)
+SUMMARY_CACHE_PATH = os.environ.get("SUMMARY_CACHE_PATH", "/tmp/summary_cache.sqlite3")
+SUMMARY_CACHE_SIMILARITY = float(os.environ.get("SUMMARY_CACHE_SIMILARITY", "0"))  # Cosine threshold for semantic hits; 0 disables them
+
+# Local cache of generated skill files (empty path disables it)
+SKILL_CACHE_PATH = os.environ.get("SKILL_CACHE_PATH", "/tmp/skill_cache.sqlite3")
 
 # GCS Configuration
 GCS_BUCKET = os.environ.get("GCS_BUCKET", "ai-interviewer-sessions")
 GCS_STATE_BLOB = "session_monitor/processed_sessions.json"
+GCS_STATE_LOG_BLOB = "session_monitor/processed_sessions.log"  # Append-only log of IDs added since the snapshot
 
 # GCP Configuration for Vertex AI
 # Cloud Run sets GOOGLE_CLOUD_PROJECT, but also try K_SERVICE project detection
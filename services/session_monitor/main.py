@@ -17,17 +17,30 @@ Usage:
 """
 
 import argparse
-import json
+import asyncio
 import logging
 import sys
-import time
-from datetime import datetime
-
-from .config import CHECK_INTERVAL_SECONDS, GCS_BUCKET, secrets
-from .napster_client import NapsterSpacesClient
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Awaitable, List, Optional, Union
+
+import orjson
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from .config import (
+    CHECK_INTERVAL_SECONDS,
+    GCS_BUCKET,
+    LLM_CONCURRENCY,
+    MAX_CONCURRENT_SESSIONS,
+    SUMMARY_BATCH_SIZE,
+    WORKER_THREADS,
+    secrets,
+)
+from .clients import get_napster_client, get_skill_generator, get_storage_client, get_summarizer
+from .napster_client import SessionTranscript
+from .rate_limiter import RateLimitExceeded
 from .state_manager import StateManager
-from .summarizer import GeminiSummarizer
-from .skill_generator import SkillGenerator
+from .summarizer import ConversationSummary
 
 # Configure logging
 logging.basicConfig(
@@ -44,162 +57,296 @@ class SessionMonitor:
     def __init__(self):
         logger.info("Initializing Session Monitor Service...")
 
-        self.napster_client = NapsterSpacesClient()
+        self.napster_client = get_napster_client()
         self.state_manager = StateManager()
-        self.summarizer = GeminiSummarizer()
-        self.skill_generator = SkillGenerator()
+        self.summarizer = get_summarizer()
+        self.skill_generator = get_skill_generator()
         
         # Initialize GCS client
         self.gcs_client = None
         self.gcs_bucket = None
         if GCS_BUCKET:
             try:
-                from google.cloud import storage
-                self.gcs_client = storage.Client()
+                self.gcs_client = get_storage_client()
                 self.gcs_bucket = self.gcs_client.bucket(GCS_BUCKET)
                 logger.info(f"Initialized GCS bucket: {GCS_BUCKET}")
             except Exception as e:
                 logger.error(f"Failed to initialize GCS: {e}")
 
+        # Blocking client calls run on a dedicated, bounded pool; asyncio's
+        # default executor is sized from the CPU count, which on a 1-vCPU
+        # Cloud Run instance would cap concurrency well below the semaphore
+        self._executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="session-worker")
+
+        # Refreshed once per check cycle; lets sessions skip the workflow
+        # lookup entirely while the bucket has no workflows at all
+        self._has_any_workflows = True
+
         logger.info("Session Monitor Service initialized successfully")
 
     def _save_to_gcs(self, path: str, data: dict):
-        """Save data to GCS."""
+        """
+        Save data to GCS.
+
+        Objects are create-only (if_generation_match=0), so a retried run
+        that re-processes a session leaves the existing object untouched.
+        """
         if not self.gcs_bucket:
             logger.warning("GCS not configured, skipping save")
             return
 
         try:
             blob = self.gcs_bucket.blob(path)
-            blob.upload_from_string(json.dumps(data, indent=2))
+            blob.upload_from_string(orjson.dumps(data), content_type="application/json", if_generation_match=0)
             logger.info(f"Saved to GCS: {path}")
+        except PreconditionFailed:
+            logger.info(f"Already in GCS, skipping: {path}")
         except Exception as e:
             logger.error(f"Failed to save to GCS {path}: {e}")
 
+    def _save_transcript_to_gcs(self, transcript: SessionTranscript, processed_at: str):
+        """Save a transcript to GCS (create-only), serialized straight from its columns."""
+        entries = zip(transcript.texts, transcript.roles, transcript.timestamps)
+        self._save_to_gcs(f"transcripts/{transcript.session_id}.json", {
+            "session_id": transcript.session_id,
+            "entries": [{"text": text, "role": role, "timestamp": timestamp} for text, role, timestamp in entries],
+            "processed_at": processed_at
+        })
+
+    def _check_for_workflows(self) -> bool:
+        """Check whether any workflows exist in GCS, with a single list call."""
+        if not self.gcs_bucket:
+            return False
+
+        try:
+            return any(True for _ in self.gcs_bucket.list_blobs(prefix="workflows/", max_results=1))
+        except Exception as e:
+            logger.warning(f"Failed to list workflows, falling back to per-session lookups: {e}")
+            return True
+
     def _load_workflows_from_gcs(self, session_id: str) -> list:
         """Load workflows for a session from GCS."""
-        if not self.gcs_bucket:
+        if not self.gcs_bucket or not self._has_any_workflows:
             return []
 
         try:
             blob = self.gcs_bucket.blob(f"workflows/{session_id}.json")
-            if blob.exists():
-                content = blob.download_as_string()
-                data = json.loads(content)
-                return data.get("workflows", [])
+            data = orjson.loads(blob.download_as_bytes())
+            return data.get("workflows", [])
+        except NotFound:
+            return []
         except Exception as e:
             logger.debug(f"No workflows found for session {session_id[:20]}...: {e}")
 
         return []
 
-    def check_and_process(self) -> int:
+    async def _run_blocking(self, func, *args):
+        """Run a blocking call on the monitor's worker pool."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _save_state(self):
+        """Persist newly processed sessions with a single state write."""
+        await self._run_blocking(self.state_manager.flush, True)
+
+    def _start_summaries(
+        self,
+        transcripts: List[SessionTranscript],
+        llm_semaphore: asyncio.Semaphore
+    ) -> List[Awaitable[Optional[ConversationSummary]]]:
         """
-        Check for new sessions and process them.
-        
+        Start summarizing transcripts, SUMMARY_BATCH_SIZE per Gemini request.
+
+        Returns:
+            One awaitable per transcript resolving to its summary
+        """
+        async def summarize(batch: List[SessionTranscript]) -> List[Union[ConversationSummary, RateLimitExceeded, None]]:
+            async with llm_semaphore:
+                return await self.summarizer.summarize_batch_async(batch, executor=self._executor)
+
+        async def batch_item(batch: "asyncio.Task", index: int) -> Optional[ConversationSummary]:
+            # Only the sessions that were actually throttled are deferred
+            result = (await batch)[index]
+            if isinstance(result, RateLimitExceeded):
+                raise result
+            return result
+
+        summaries = []
+        for start in range(0, len(transcripts), SUMMARY_BATCH_SIZE):
+            batch = transcripts[start:start + SUMMARY_BATCH_SIZE]
+            task = asyncio.create_task(summarize(batch))
+            summaries.extend(batch_item(task, index) for index in range(len(batch)))
+        return summaries
+
+    async def _process_one(
+        self,
+        session_id: str,
+        transcript: SessionTranscript,
+        summary_pending: Awaitable[Optional[ConversationSummary]],
+        llm_semaphore: asyncio.Semaphore
+    ) -> bool:
+        """
+        Process a single session end-to-end from its fetched transcript.
+
+        The summary is produced by a batched Gemini request shared with other
+        sessions (see _start_summaries). Gemini and Claude calls are async and
+        share llm_semaphore; the GCS client is synchronous, so its calls are
+        pushed onto worker threads to let sessions overlap.
+
+        Returns:
+            True if the session was processed and marked as such
+        """
+        try:
+            logger.info(f"Processing session {session_id[:20]}...")
+            processed_at = datetime.now(timezone.utc).isoformat()
+
+            # Save transcript to GCS
+            # Uploads don't depend on each other, so let them overlap with generation
+            uploads = [
+                asyncio.create_task(
+                    self._run_blocking(self._save_transcript_to_gcs, transcript, processed_at)
+                )
+            ]
+
+            # Wait for this session's summary
+            summary = await summary_pending
+            summary_data = None
+
+            if summary:
+                # Save summary to GCS
+                summary_data = {
+                    **summary.to_dict(),
+                    "processed_at": processed_at
+                }
+                uploads.append(asyncio.create_task(
+                    self._run_blocking(self._save_to_gcs, f"summaries/{session_id}.json", summary_data)
+                ))
+                logger.info(f"Successfully processed session {session_id[:20]}...")
+            else:
+                logger.warning(f"Failed to generate summary for {session_id[:20]}...")
+
+            # Load workflows for this session (if any)
+            workflows = await self._run_blocking(self._load_workflows_from_gcs, session_id)
+
+            # Generate skill file
+            if summary_data or workflows:
+                async with llm_semaphore:
+                    skill_content = await self.skill_generator.generate_async(
+                        summary_data, workflows, executor=self._executor
+                    )
+                if skill_content:
+                    skill_data = {
+                        "session_id": session_id,
+                        "skill_content": skill_content,
+                        "generated_at": processed_at
+                    }
+                    uploads.append(asyncio.create_task(
+                        self._run_blocking(self._save_to_gcs, f"skills/{session_id}.json", skill_data)
+                    ))
+                    logger.info(f"Generated skill file for session {session_id[:20]}...")
+
+            await asyncio.gather(*uploads)
+
+            # Mark as processed
+            await self._run_blocking(self.state_manager.mark_as_processed, session_id)
+            return True
+
+        except RateLimitExceeded as e:
+            # Not marked as processed, so the next check cycle picks it up again
+            logger.warning(f"Deferring session {session_id[:20]}... to the next check: {e}")
+            return False
+
+        except Exception as e:
+            logger.error(f"Error processing session {session_id[:20]}...: {e}", exc_info=True)
+            return False
+
+    async def check_and_process_async(self) -> int:
+        """
+        Check for new sessions and process them concurrently.
+
+        At most MAX_CONCURRENT_SESSIONS sessions are in flight at once.
+
         Returns:
             Number of sessions processed
         """
         logger.info("Checking for new sessions...")
-        
+
         # Get all session IDs from Napster API
-        all_session_ids = self.napster_client.get_session_ids()
-        
+        all_session_ids = await self._run_blocking(self.napster_client.get_session_ids)
+
         if not all_session_ids:
             logger.info("No sessions found")
             return 0
-        
-        # Load already-processed sessions
-        processed_sessions = self.state_manager.load_processed_sessions()
-        
-        # Find new sessions
-        new_sessions = [sid for sid in all_session_ids if sid not in processed_sessions]
-        
+
+        # Find new sessions (de-duplicated, in API order) against StateManager's
+        # in-memory set; the first call loads it from storage
+        new_sessions = await self._run_blocking(self.state_manager.unprocessed, all_session_ids)
+
         if not new_sessions:
-            logger.info(f"No new sessions to process (total: {len(all_session_ids)}, processed: {len(processed_sessions)})")
+            logger.info(
+                f"No new sessions to process (total: {len(all_session_ids)}, "
+                f"processed: {self.state_manager.processed_count()})"
+            )
             return 0
-        
+
         logger.info(f"Found {len(new_sessions)} new session(s) to process")
-        
-        processed_count = 0
-        
+
+        self._has_any_workflows = await self._run_blocking(self._check_for_workflows)
+
+        # Fetch all transcripts up front over the shared connection pool
+        transcripts = await self.napster_client.get_transcripts(new_sessions, executor=self._executor)
         for session_id in new_sessions:
-            try:
-                logger.info(f"Processing session {session_id[:20]}...")
-                
-                # Get transcript
-                transcript = self.napster_client.get_transcript(session_id)
-                
-                if not transcript:
-                    logger.warning(f"No transcript available for {session_id[:20]}..., skipping")
-                    continue
-                
-                # Save transcript to GCS
-                transcript_data = {
-                    "session_id": session_id,
-                    "entries": [
-                        {
-                            "text": entry.text,
-                            "role": entry.role,
-                            "timestamp": entry.timestamp
-                        }
-                        for entry in transcript.entries
-                    ],
-                    "processed_at": datetime.utcnow().isoformat()
-                }
-                self._save_to_gcs(f"transcripts/{session_id}.json", transcript_data)
-                
-                # Generate summary
-                summary = self.summarizer.summarize(transcript)
-                summary_data = None
-
-                if summary:
-                    # Save summary to GCS
-                    summary_data = {
-                        **summary.to_dict(),
-                        "processed_at": datetime.utcnow().isoformat()
-                    }
-                    self._save_to_gcs(f"summaries/{session_id}.json", summary_data)
-                    logger.info(f"Successfully processed session {session_id[:20]}...")
-                else:
-                    logger.warning(f"Failed to generate summary for {session_id[:20]}...")
-
-                # Load workflows for this session (if any)
-                workflows = self._load_workflows_from_gcs(session_id)
-
-                # Generate skill file
-                if summary_data or workflows:
-                    skill_content = self.skill_generator.generate(summary_data, workflows)
-                    if skill_content:
-                        skill_data = {
-                            "session_id": session_id,
-                            "skill_content": skill_content,
-                            "generated_at": datetime.utcnow().isoformat()
-                        }
-                        self._save_to_gcs(f"skills/{session_id}.json", skill_data)
-                        logger.info(f"Generated skill file for session {session_id[:20]}...")
-
-                # Mark as processed
-                self.state_manager.mark_as_processed(session_id)
-                processed_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing session {session_id[:20]}...: {e}", exc_info=True)
-        
+            if session_id not in transcripts:
+                logger.warning(f"No transcript available for {session_id[:20]}..., skipping")
+
+        # Model calls are bounded separately from sessions, to stay within API rate limits
+        llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+        summaries = self._start_summaries(list(transcripts.values()), llm_semaphore)
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SESSIONS)
+
+        async def process_bounded(session_id: str, transcript: SessionTranscript, summary_pending) -> bool:
+            async with semaphore:
+                return await self._process_one(session_id, transcript, summary_pending, llm_semaphore)
+
+        results = await asyncio.gather(
+            *(
+                process_bounded(session_id, transcript, summary_pending)
+                for (session_id, transcript), summary_pending in zip(transcripts.items(), summaries)
+            ),
+            return_exceptions=True
+        )
+        processed_count = sum(1 for result in results if result is True)
+
+        await self._save_state()
+
         logger.info(f"Completed processing {processed_count} session(s)")
         return processed_count
 
-    def run_daemon(self, interval: int = CHECK_INTERVAL_SECONDS):
-        """Run continuously, checking for new sessions at regular intervals."""
-        logger.info(f"Starting daemon mode (checking every {interval} seconds)")
-        
+    def check_and_process(self) -> int:
+        """
+        Check for new sessions and process them.
+
+        Returns:
+            Number of sessions processed
+        """
+        return asyncio.run(self.check_and_process_async())
+
+    async def _run_daemon_async(self, interval: int):
+        """Check for new sessions at regular intervals on one event loop."""
         while True:
             try:
-                self.check_and_process()
+                await self.check_and_process_async()
             except Exception as e:
                 logger.error(f"Error in daemon loop: {e}", exc_info=True)
             
             logger.info(f"Sleeping for {interval} seconds...")
-            time.sleep(interval)
+            await asyncio.sleep(interval)
+
+    def run_daemon(self, interval: int = CHECK_INTERVAL_SECONDS):
+        """Run continuously, checking for new sessions at regular intervals."""
+        logger.info(f"Starting daemon mode (checking every {interval} seconds)")
+        # A single loop for all cycles keeps the async model clients bound to it
+        asyncio.run(self._run_daemon_async(interval))
 
 
 def main():
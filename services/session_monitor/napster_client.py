@@ -1,16 +1,28 @@
 """Napster Spaces API Client for session analytics."""
 
-import requests
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+import asyncio
 import logging
+from array import array
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from .config import NAPSTER_API_BASE_URL, EXPERIENCE_ID, secrets
+from .config import NAPSTER_API_BASE_URL, EXPERIENCE_ID, MAX_CONCURRENT_SESSIONS, secrets
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+def _to_millis(timestamp) -> int:
+    """Normalize an API timestamp (int, float or missing) for the int64 timestamp column."""
+    return int(timestamp or 0)
+
+
+@dataclass(slots=True, frozen=True)
 class TranscriptEntry:
     """A single entry in a conversation transcript."""
     text: str
@@ -18,29 +30,56 @@ class TranscriptEntry:
     timestamp: int
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionTranscript:
-    """Full transcript for a session."""
+    """
+    Full transcript for a session.
+
+    Entries are stored column-wise (parallel texts/roles/timestamps) rather
+    than as one TranscriptEntry object per line.
+    """
     session_id: str
-    entries: List[TranscriptEntry]
+    texts: List[str] = field(default_factory=list)
+    roles: List[str] = field(default_factory=list)  # 'agent' or 'user'
+    timestamps: array = field(default_factory=lambda: array("q"))  # milliseconds
+
+    @classmethod
+    def from_entries(cls, session_id: str, entries: Iterable[TranscriptEntry]) -> "SessionTranscript":
+        """Build a transcript from a sequence of TranscriptEntry objects."""
+        transcript = cls(session_id=session_id)
+        for entry in entries:
+            transcript.texts.append(entry.text)
+            transcript.roles.append(entry.role)
+            transcript.timestamps.append(_to_millis(entry.timestamp))
+        return transcript
+
+    @property
+    def entries(self) -> List[TranscriptEntry]:
+        """Transcript entries as TranscriptEntry objects (built on access)."""
+        return [
+            TranscriptEntry(text, role, timestamp)
+            for text, role, timestamp in zip(self.texts, self.roles, self.timestamps)
+        ]
 
     def to_conversation_text(self) -> str:
         """Convert transcript to readable conversation format."""
-        lines = []
-        for entry in self.entries:
-            speaker = "AI Assistant" if entry.role == "agent" else "User"
-            lines.append(f"{speaker}: {entry.text}")
-        return "\n".join(lines)
+        return "\n".join(
+            f"{'AI Assistant' if role == 'agent' else 'User'}: {text}"
+            for role, text in zip(self.roles, self.texts)
+        )
+
+    def to_user_text(self) -> str:
+        """The employee's side of the conversation only, one turn per line."""
+        return "\n".join(text for role, text in zip(self.roles, self.texts) if role == "user")
 
     def has_meaningful_content(self) -> bool:
         """Check if the transcript has meaningful conversation content."""
-        user_messages = [e for e in self.entries if e.role == "user"]
-        return len(user_messages) >= 1 and len(self.entries) >= 2
+        return "user" in self.roles and len(self.roles) >= 2
 
     def get_first_timestamp(self) -> Optional[int]:
         """Get the timestamp of the first transcript entry (in milliseconds)."""
-        if self.entries and len(self.entries) > 0:
-            return self.entries[0].timestamp
+        if self.timestamps:
+            return self.timestamps[0]
         return None
 
 
@@ -63,18 +102,47 @@ class NapsterSpacesClient:
             "X-API-Key": self.api_key,
             "Content-Type": "application/json"
         })
+
+        # Size the keep-alive pool for concurrent transcript fetches and retry
+        # transient failures with backoff
+        adapter = HTTPAdapter(
+            pool_connections=MAX_CONCURRENT_SESSIONS,
+            pool_maxsize=MAX_CONCURRENT_SESSIONS,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.2,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"]
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Last session list and its ETag, for conditional polling
+        self._sessions_etag: Optional[str] = None
+        self._cached_session_ids: List[str] = []
     
     def get_session_ids(self) -> List[str]:
         """Get all session IDs for the experience."""
         url = f"{self.base_url}/{self.experience_id}/analytics/sessions"
         
+        headers = {}
+        if self._sessions_etag:
+            headers["If-None-Match"] = self._sessions_etag
+
         try:
-            response = self.session.get(url, timeout=30)
+            response = self.session.get(url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                logger.info(f"Session list unchanged ({len(self._cached_session_ids)} sessions)")
+                return self._cached_session_ids
+
             response.raise_for_status()
             data = response.json()
             
             if data.get("success"):
                 session_ids = data.get("sessionIds", [])
+                self._sessions_etag = response.headers.get("ETag")
+                self._cached_session_ids = session_ids
                 logger.info(f"Retrieved {len(session_ids)} sessions")
                 return session_ids
             else:
@@ -92,30 +160,64 @@ class NapsterSpacesClient:
         try:
             response = self.session.get(url, timeout=30)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             
-            if data.get("success") and "transcript" in data:
-                entries = [
-                    TranscriptEntry(
-                        text=entry.get("text", ""),
-                        role=entry.get("role", ""),
-                        timestamp=entry.get("timestamp", 0)
-                    )
-                    for entry in data["transcript"]
-                ]
-                
+            if isinstance(data, dict) and data.get("success") and isinstance(data.get("transcript"), list):
+                # Fill the transcript columns straight from the parsed JSON
+                raw_entries = data["transcript"]
                 transcript = SessionTranscript(
                     session_id=session_id,
-                    entries=entries
+                    texts=[entry.get("text", "") for entry in raw_entries],
+                    roles=[entry.get("role", "") for entry in raw_entries],
+                    timestamps=array("q", [_to_millis(entry.get("timestamp")) for entry in raw_entries])
                 )
                 
-                logger.info(f"Retrieved transcript for session {session_id[:20]}... ({len(entries)} entries)")
+                logger.info(f"Retrieved transcript for session {session_id[:20]}... ({len(raw_entries)} entries)")
                 return transcript
             else:
                 logger.warning(f"No transcript available for session {session_id[:20]}...")
                 return None
                 
-        except requests.exceptions.RequestException as e:
+        # ValueError covers bad JSON and non-numeric timestamps; TypeError and
+        # AttributeError cover entries that aren't objects
+        except (requests.exceptions.RequestException, ValueError, TypeError, AttributeError) as e:
             logger.error(f"Failed to get transcript for {session_id[:20]}...: {e}")
             return None
 
+    async def get_transcripts(
+        self,
+        session_ids: List[str],
+        executor: Optional[Executor] = None
+    ) -> Dict[str, SessionTranscript]:
+        """
+        Get transcripts for many sessions at once.
+
+        Requests are issued concurrently over the session's keep-alive pool,
+        at most MAX_CONCURRENT_SESSIONS in flight.
+
+        Args:
+            session_ids: Sessions to fetch
+            executor: Thread pool for the blocking requests (default: the loop's)
+
+        Returns:
+            Mapping of session ID to transcript, for sessions that have one
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_SESSIONS)
+
+        async def fetch(session_id: str) -> Optional[SessionTranscript]:
+            async with semaphore:
+                return await loop.run_in_executor(executor, self.get_transcript, session_id)
+
+        # One failed fetch shouldn't abort the rest of the batch
+        results = await asyncio.gather(
+            *(fetch(session_id) for session_id in session_ids),
+            return_exceptions=True
+        )
+        transcripts = {}
+        for session_id, result in zip(session_ids, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to get transcript for {session_id[:20]}...: {result}", exc_info=result)
+            elif result is not None:
+                transcripts[session_id] = result
+        return transcripts
@@ -8,58 +8,87 @@ This service handles batch processing of sessions:
 
 This endpoint is deployed as a private Cloud Run service (--no-allow-unauthenticated)
 and is only callable by Cloud Scheduler with proper IAM authentication.
+
+The app runs on uvicorn/uvloop, so health checks are answered while a batch
+is in flight.
 """
 
-import json
+import asyncio
 import logging
 import os
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+from typing import Optional, TYPE_CHECKING
 
-logger = logging.getLogger(__name__)
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
 
+if TYPE_CHECKING:
+    from .main import SessionMonitor
+
+logger = logging.getLogger(__name__)
 
-class ProcessorHandler(BaseHTTPRequestHandler):
-    """HTTP handler for the processor service."""
+# The monitor (and its API/storage clients) is built once per process and
+# reused across Cloud Scheduler invocations
+_MONITOR: Optional["SessionMonitor"] = None
+_MONITOR_LOCK = threading.Lock()
 
-    def _send_json(self, status: int, data: dict):
-        """Send JSON response."""
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+# Only one batch runs at a time; overlapping triggers wait their turn
+_PROCESS_LOCK = asyncio.Lock()
 
-    def do_GET(self):
-        """Handle GET requests - health check only."""
-        if self.path == "/health" or self.path == "/":
-            self._send_json(200, {"status": "healthy", "service": "session-processor"})
-        else:
-            self._send_json(404, {"error": "Not found"})
 
-    def do_POST(self):
-        """Handle POST requests - process sessions."""
-        if self.path == "/" or self.path == "/process":
-            try:
+def get_monitor() -> "SessionMonitor":
+    """Get the process-wide SessionMonitor, creating it on first use."""
+    global _MONITOR
+    if _MONITOR is None:
+        with _MONITOR_LOCK:
+            if _MONITOR is None:
                 from .main import SessionMonitor
+                _MONITOR = SessionMonitor()
+    return _MONITOR
 
-                logger.info("Starting batch session processing...")
-                monitor = SessionMonitor()
-                processed = monitor.check_and_process()
 
-                logger.info(f"Batch processing complete: {processed} session(s) processed")
-                self._send_json(200, {
-                    "success": True,
-                    "message": f"Processed {processed} session(s)",
-                    "processed_count": processed
-                })
-            except Exception as e:
-                logger.error(f"Failed to process sessions: {e}", exc_info=True)
-                self._send_json(500, {"error": str(e)})
-        else:
-            self._send_json(404, {"error": "Not found"})
+async def health(request: Request) -> JSONResponse:
+    """Handle GET requests - health check only."""
+    return JSONResponse({"status": "healthy", "service": "session-processor"})
 
-    def log_message(self, format, *args):
-        """Override to use our logger."""
-        logger.info(f"{self.address_string()} - {format % args}")
+
+async def process(request: Request) -> JSONResponse:
+    """Handle POST requests - process sessions."""
+    try:
+        async with _PROCESS_LOCK:
+            logger.info("Starting batch session processing...")
+            monitor = await asyncio.to_thread(get_monitor)
+            processed = await monitor.check_and_process_async()
+
+        logger.info(f"Batch processing complete: {processed} session(s) processed")
+        return JSONResponse({
+            "success": True,
+            "message": f"Processed {processed} session(s)",
+            "processed_count": processed
+        })
+    except Exception as e:
+        logger.error(f"Failed to process sessions: {e}", exc_info=True)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def not_found(request: Request, exc: Exception) -> JSONResponse:
+    """Return JSON 404 for unknown routes, and for known routes called with the wrong method."""
+    return JSONResponse({"error": "Not found"}, status_code=404)
+
+
+app = Starlette(
+    routes=[
+        Route("/", health, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/", process, methods=["POST"]),
+        Route("/process", process, methods=["POST"]),
+    ],
+    # Starlette answers a wrong method with a plain-text 405; keep the JSON 404
+    exception_handlers={404: not_found, 405: not_found},
+)
 
 
 def run_processor(host: str = "0.0.0.0", port: int = 8080):
@@ -69,7 +98,6 @@ def run_processor(host: str = "0.0.0.0", port: int = 8080):
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
-    server = HTTPServer((host, port), ProcessorHandler)
     logger.info(f"Starting Session Processor on {host}:{port}")
     logger.info("This is a PRIVATE service - only callable by Cloud Scheduler")
     logger.info("Endpoints:")
@@ -77,11 +105,8 @@ def run_processor(host: str = "0.0.0.0", port: int = 8080):
     logger.info("  POST /        - Process sessions (trigger batch job)")
     logger.info("  POST /process - Process sessions (alias)")
 
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        logger.info("Shutting down processor...")
-        server.shutdown()
+    # log_config=None keeps uvicorn's loggers on the format configured above
+    uvicorn.run(app, host=host, port=port, workers=1, loop="uvloop", log_config=None)
 
 
 if __name__ == "__main__":
@@ -92,4 +117,3 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     run_processor(args.host, args.port)
-
@@ -0,0 +1,113 @@
+"""Request and token rate limiting for Gemini calls."""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import List, Tuple
+
+from .config import GEMINI_MAX_WAIT_SECONDS, GEMINI_RPM, GEMINI_TPM
+
+# Rough prompt size estimate; only needs to be in the right ballpark for pacing
+_CHARS_PER_TOKEN = 4
+
+# How often a queued caller that isn't first in line re-checks its turn
+_POLL_SECONDS = 0.05
+
+
+class RateLimitExceeded(Exception):
+    """Raised instead of blocking when a call can't be admitted within the wait limit."""
+
+
+class _TokenBucket:
+    """Per-minute budget that refills continuously. A limit of 0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.available = float(per_minute)
+        self._rate = per_minute / 60.0
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.available = min(self.capacity, self.available + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (0 if it is now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # A single call bigger than the whole bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) / self._rate)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self.available -= min(amount, self.capacity)
+
+
+class GeminiRateLimiter:
+    """
+    Shared requests-per-minute and tokens-per-minute limiter for Gemini.
+
+    Callers wait in priority order (lower number first, FIFO within a
+    priority). A caller that can't be admitted within max_wait seconds gets
+    RateLimitExceeded instead of waiting indefinitely, so the work can be
+    retried later.
+    """
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM, max_wait: float = GEMINI_MAX_WAIT_SECONDS):
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def estimate_tokens(prompt: str) -> int:
+        return len(prompt) // _CHARS_PER_TOKEN + 1
+
+    def _enqueue(self, priority: int) -> Tuple[int, int]:
+        entry = (priority, next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._queue, entry)
+        return entry
+
+    def _dequeue(self, entry: Tuple[int, int]):
+        with self._lock:
+            if entry in self._queue:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+
+    def _try_admit(self, entry: Tuple[int, int], tokens: int) -> float:
+        """Admit entry if it's first in line and within budget; else return seconds to wait."""
+        with self._lock:
+            if self._queue[0] != entry:
+                return _POLL_SECONDS
+            now = time.monotonic()
+            wait = max(self._requests.wait_time(1, now), self._tokens.wait_time(tokens, now))
+            if wait == 0:
+                self._requests.take(1)
+                self._tokens.take(tokens)
+                heapq.heappop(self._queue)
+            return wait
+
+    def _check_deadline(self, deadline: float, wait: float):
+        if time.monotonic() + wait > deadline:
+            raise RateLimitExceeded(f"Gemini rate limit: no capacity within {self.max_wait:.0f}s")
+
+    async def acquire(self, tokens: int, priority: int = 0):
+        """Wait until a call using tokens may start."""
+        deadline = time.monotonic() + self.max_wait
+        entry = self._enqueue(priority)
+        try:
+            while True:
+                wait = self._try_admit(entry, tokens)
+                if wait == 0:
+                    return
+                self._check_deadline(deadline, wait)
+                await asyncio.sleep(wait)
+        finally:
+            self._dequeue(entry)
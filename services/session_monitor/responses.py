@@ -0,0 +1,151 @@
+"""Helpers for cleaning up raw LLM responses."""
+
+import json
+import logging
+import re
+from typing import Optional
+
+try:
+    import json_repair
+except ImportError:
+    json_repair = None
+
+logger = logging.getLogger(__name__)
+
+# Matches a response wrapped in a ```markdown / ```md / ```json / ``` code fence
+_FENCE_RE = re.compile(
+    r"\A\s*```(?:markdown|md|json)?[^\S\n]*\n(.*?)\n?```\s*\Z",
+    re.DOTALL | re.IGNORECASE,
+)
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def strip_code_fence(text: str) -> str:
+    """Remove a markdown code block wrapping the whole response, if present."""
+    match = _FENCE_RE.match(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+class JsonScanner:
+    """
+    Incrementally tracks the first top-level JSON object or array in a text.
+
+    Feed text as it arrives; complete becomes True as soon as the outermost
+    brace or bracket closes, so a streamed response can be cut off there.
+    """
+
+    def __init__(self):
+        self.text_parts = []
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.broken = False
+        self._offset = 0
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        # Last position where a nested container closed, and what was still open
+        self.last_close: Optional[int] = None
+        self.open_at_last_close = ""
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """Scan another piece of text. Returns True once the document is complete."""
+        self.text_parts.append(chunk)
+        offset = self._offset
+        self._offset += len(chunk)
+        if self.complete or self.broken:
+            return self.complete
+
+        for position, char in enumerate(chunk):
+            index = offset + position
+            if self.start is None:
+                if char in _CLOSERS:
+                    self.start = index
+                    self._stack.append(_CLOSERS[char])
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._stack.append(_CLOSERS[char])
+            elif char in "}]":
+                if self._stack[-1] != char:
+                    self.broken = True
+                    break
+                self._stack.pop()
+                if not self._stack:
+                    self.end = index + 1
+                    break
+                self.last_close = index
+                self.open_at_last_close = "".join(reversed(self._stack))
+        return self.complete
+
+    def document(self) -> Optional[str]:
+        """The complete top-level document, or None if it hasn't closed."""
+        if not self.complete:
+            return None
+        return "".join(self.text_parts)[self.start:self.end]
+
+
+def _balance_json(text: str) -> Optional[str]:
+    """
+    Cut text down to its first top-level JSON object or array.
+
+    Text after the closing brace is dropped. If the value was cut off, it is
+    truncated after the last container that did close, and the containers
+    still open are closed.
+    """
+    scanner = JsonScanner()
+    scanner.feed(text)
+    if scanner.complete:
+        return scanner.document()
+    if scanner.last_close is None:
+        return None
+    return text[scanner.start:scanner.last_close + 1] + scanner.open_at_last_close
+
+
+def parse_json(text: str):
+    """
+    Parse JSON from an LLM response, recovering from common damage.
+
+    Tries, in order: plain json.loads, json_repair (if installed), and
+    trimming to the outermost balanced object or array.
+
+    Raises:
+        ValueError: if none of these produce a JSON object or array
+    """
+    text = strip_code_fence(text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        error = e
+
+    if json_repair is not None:
+        try:
+            repaired = json_repair.loads(text)
+            if isinstance(repaired, (dict, list)) and repaired:
+                logger.warning(f"Recovered malformed JSON response with json_repair: {error}")
+                return repaired
+        except Exception:
+            pass
+
+    balanced = _balance_json(text)
+    if balanced is not None:
+        try:
+            data = json.loads(balanced)
+            logger.warning(f"Recovered malformed JSON response by trimming to balanced braces: {error}")
+            return data
+        except json.JSONDecodeError:
+            pass
+
+    raise error
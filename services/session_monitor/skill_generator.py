@@ -1,25 +1,38 @@
 """Generate Claude Code skill files from interview data."""
 
-import json
+import asyncio
 import logging
 import os
-from typing import Optional
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING, Optional
 
-from anthropic import AnthropicVertex
+import orjson
 
-from .config import GCP_PROJECT_ID, GCP_REGION
+from .cache import SkillCache
+from .config import (
+    GCP_PROJECT_ID,
+    GCP_REGION,
+    SKILL_CACHE_PATH,
+    SKILL_LIGHT_MAX_WORKFLOWS,
+    SKILL_LIGHT_MODEL,
+    SKILL_MODEL,
+)
+from .responses import strip_code_fence
 
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropicVertex
 
-SKILL_PROMPT = """You are an expert at creating extremely comprehensive, production-ready Claude Code skill files.
+logger = logging.getLogger(__name__)
 
-Based on the interview data below, create the MOST DETAILED Claude Code skill file possible in Markdown format.
+# Role, output scaffold and requirements are identical on every call, so they
+# go in the system prompt, marked for Anthropic's prompt cache; the user
+# message (SKILL_USER_PROMPT) carries only the interview data. Caching only
+# applies once the prefix reaches the model's minimum cacheable length, which
+# this prompt (roughly 2k tokens) may not reach on every model, so cache reads
+# are logged with each generation
+SKILL_SYSTEM_PROMPT = """You are an expert at creating extremely comprehensive, production-ready Claude Code skill files.
 
-INTERVIEW SUMMARY:
-{summary}
-
-IDENTIFIED WORKFLOWS:
-{workflows}
+Based on the interview data in the user's message, create the MOST DETAILED Claude Code skill file possible in Markdown format.
 
 Generate a HIGHLY DETAILED skill file that is immediately usable by Claude Code. Follow this structure:
 
@@ -261,6 +274,18 @@ CRITICAL REQUIREMENTS:
 Return ONLY the Markdown content, ready to be saved as a .md file.
 """
 
+SKILL_USER_PROMPT = """INTERVIEW SUMMARY:
+{summary}
+
+IDENTIFIED WORKFLOWS:
+{workflows}
+"""
+
+# Split the template around its placeholders once, so building a prompt is a
+# plain join rather than a str.format pass over the whole template
+_PROMPT_HEAD, _PROMPT_REST = SKILL_USER_PROMPT.split("{summary}")
+_PROMPT_MID, _PROMPT_TAIL = _PROMPT_REST.split("{workflows}")
+
 
 class SkillGenerator:
     """Generates Claude Code skill files from interview data using Claude Opus 4.6."""
@@ -270,20 +295,110 @@ class SkillGenerator:
         if not GCP_PROJECT_ID:
             raise ValueError("GCP_PROJECT_ID is required for Vertex AI")
 
-        self.client = AnthropicVertex(
+        # Imported here rather than at module load to keep cold starts cheap
+        from anthropic import AsyncAnthropicVertex
+
+        # One async client serves both generate_async and the blocking generate wrapper
+        self.client: "AsyncAnthropicVertex" = AsyncAnthropicVertex(
             project_id=GCP_PROJECT_ID,
             region=GCP_REGION,
         )
-        self.model = "claude-opus-4-6"
-        logger.info(f"Initialized Skill Generator with Claude Opus 4.6 via Vertex AI (project: {GCP_PROJECT_ID}, region: {GCP_REGION})")
+        self.model = SKILL_MODEL
+        logger.info(f"Initialized Skill Generator with {SKILL_MODEL} via Vertex AI (project: {GCP_PROJECT_ID}, region: {GCP_REGION})")
+
+        # Skills are cached by their inputs so retries and re-runs skip Claude
+        self.cache = None
+        if SKILL_CACHE_PATH:
+            try:
+                self.cache = SkillCache()
+            except Exception as e:
+                logger.warning(f"Failed to open skill cache, continuing without it: {e}")
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        """Look up a cached skill file, treating cache errors as misses."""
+        if not self.cache:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"Skill cache lookup failed: {e}")
+            return None
+
+    def _put_cached(self, key: str, skill_content: str):
+        """Store a skill file in the cache, if enabled."""
+        if not self.cache or not skill_content:
+            return
+        try:
+            self.cache.put(key, skill_content)
+        except Exception as e:
+            logger.warning(f"Failed to cache skill file: {e}")
+
+    def _route_model(self, summary: dict, workflows: list) -> str:
+        """Use the light model when the interview surfaced only a few workflows."""
+        if not SKILL_LIGHT_MODEL:
+            return self.model
+        identified = (summary or {}).get("workflow_analysis", {}).get("identified_workflows") or []
+        if len(identified) + len(workflows or []) <= SKILL_LIGHT_MAX_WORKFLOWS:
+            return SKILL_LIGHT_MODEL
+        return self.model
+
+    @staticmethod
+    def _build_request(summary: dict, workflows: list) -> dict:
+        """Build the Messages API arguments for a skill generation request."""
+        # Format the data for the prompt
+        summary_text = orjson.dumps(summary).decode() if summary else "No summary available"
+        workflows_text = orjson.dumps(workflows).decode() if workflows else "No workflows identified"
+
+        interview_data = "".join([_PROMPT_HEAD, summary_text, _PROMPT_MID, workflows_text, _PROMPT_TAIL])
+
+        return {
+            "max_tokens": 8192,
+            "system": [
+                {
+                    "type": "text",
+                    "text": SKILL_SYSTEM_PROMPT,
+                    "cache_control": {"type": "ephemeral"}
+                }
+            ],
+            "messages": [
+                {"role": "user", "content": interview_data}
+            ]
+        }
+
+    @staticmethod
+    def _log_usage(model: str, message):
+        """Log token usage for a generation, including prompt cache reads and writes."""
+        usage = getattr(message, "usage", None)
+        if usage is None:
+            return
+        logger.info(
+            f"Skill generation usage with {model}: {usage.input_tokens} input tokens "
+            f"({getattr(usage, 'cache_read_input_tokens', 0) or 0} cache read, "
+            f"{getattr(usage, 'cache_creation_input_tokens', 0) or 0} cache write), "
+            f"{usage.output_tokens} output tokens"
+        )
 
     def generate(self, summary: dict, workflows: list) -> Optional[str]:
+        """Blocking wrapper around generate_async, for callers outside an event loop."""
+        return asyncio.run(self.generate_async(summary, workflows))
+
+    async def generate_async(
+        self,
+        summary: dict,
+        workflows: list,
+        executor: Optional[Executor] = None
+    ) -> Optional[str]:
         """
         Generate a Claude Code skill file from summary and workflows.
 
+        The response is streamed so long skill files arrive incrementally
+        instead of holding one request open until the last token. Cache
+        reads and writes run on the executor.
+
         Args:
             summary: The conversation summary dict
             workflows: List of identified workflows
+            executor: Thread pool for cache I/O (default: the loop's)
 
         Returns:
             Markdown string for the skill file, or None if generation fails
@@ -292,40 +407,24 @@ class SkillGenerator:
             logger.warning("No summary or workflows provided, skipping skill generation")
             return None
 
-        # Format the data for the prompt
-        summary_text = json.dumps(summary, indent=2) if summary else "No summary available"
-        workflows_text = json.dumps(workflows, indent=2) if workflows else "No workflows identified"
-
-        prompt = SKILL_PROMPT.format(
-            summary=summary_text,
-            workflows=workflows_text
-        )
+        model = self._route_model(summary, workflows)
+        cache_key = SkillCache.key(summary, workflows, model)
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(executor, self._get_cached, cache_key)
+        if cached is not None:
+            return cached
 
         try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=8192,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            skill_content = response.content[0].text.strip()
-
-            # Clean up response - remove markdown code blocks if present
-            if skill_content.startswith("```markdown"):
-                skill_content = skill_content[len("```markdown"):].strip()
-            elif skill_content.startswith("```md"):
-                skill_content = skill_content[len("```md"):].strip()
-            elif skill_content.startswith("```"):
-                skill_content = skill_content[3:].strip()
-
-            if skill_content.endswith("```"):
-                skill_content = skill_content[:-3].strip()
-
-            logger.info("Successfully generated skill file with Claude Opus 4.6")
+            request = self._build_request(summary, workflows)
+            async with self.client.messages.stream(model=model, **request) as stream:
+                parts = [text async for text in stream.text_stream]
+                self._log_usage(model, await stream.get_final_message())
+            skill_content = strip_code_fence("".join(parts))
+
+            logger.info(f"Successfully generated skill file with {model}")
+            await loop.run_in_executor(executor, self._put_cached, cache_key, skill_content)
             return skill_content
 
         except Exception as e:
             logger.error(f"Failed to generate skill file: {e}")
             return None
-
@@ -1,31 +1,77 @@
 """State management for tracking processed sessions."""
 
+import atexit
+import hashlib
 import json
 import logging
 import os
-from typing import Set
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set
 
-from .config import GCS_BUCKET, GCS_STATE_BLOB, PROCESSED_SESSIONS_FILE
+from google.api_core.exceptions import NotFound, PreconditionFailed
+
+from .clients import get_storage_client
+from .config import (
+    GCS_BUCKET,
+    GCS_STATE_BLOB,
+    GCS_STATE_LOG_BLOB,
+    PROCESSED_SESSIONS_FILE,
+    STATE_FLUSH_EVERY_N,
+    STATE_FLUSH_INTERVAL_SECONDS,
+)
+
+# Attempts at a conditional snapshot upload before giving up on concurrent writers
+_GCS_SAVE_ATTEMPTS = 3
 
 logger = logging.getLogger(__name__)
 
 
 class StateManager:
-    """Manages state of processed sessions using GCS or local file."""
+    """
+    Manages state of processed sessions using GCS or local file.
+
+    State is a JSON snapshot plus an append-only log with one session ID per
+    line. Flushes append only the new IDs; once the log grows past twice the
+    snapshot, compact() rewrites the snapshot and clears the log.
+    """
 
     def __init__(self):
         self.state_file = PROCESSED_SESSIONS_FILE
+        self.log_file = os.path.splitext(self.state_file)[0] + ".log"
         self._gcs_client = None
         self._gcs_bucket = None
+        self._lock = threading.Lock()
+        # Processed sessions, loaded from storage on first use and then kept
+        # in memory; flush() writes the ones added since the last flush
+        self._sessions: Optional[Set[str]] = None
+        self._unsaved: Set[str] = set()
+        self._last_flush = time.monotonic()
+        # Session counts in the snapshot and the log, to decide when to compact
+        self._snapshot_size = 0
+        self._log_size = 0
+        # Set when a GCS append or compaction fails, so the next flush compacts
+        self._gcs_stale = False
+        # Generation of the GCS snapshot we last read or wrote (0 = none yet) and
+        # a hash of its sessions, for conditional and no-op-skipping uploads
+        self._snapshot_generation = 0
+        self._last_uploaded_hash: Optional[bytes] = None
+        # Generation of the GCS log we last read or composed (0 = none), so
+        # appends can't overwrite entries another instance added
+        self._log_generation = 0
         
         if GCS_BUCKET:
             self._init_gcs()
+
+        # Don't lose sessions recorded since the last flush on shutdown
+        atexit.register(self.flush, force=True)
     
     def _init_gcs(self):
         """Initialize Google Cloud Storage client."""
         try:
-            from google.cloud import storage
-            self._gcs_client = storage.Client()
+            self._gcs_client = get_storage_client()
             self._gcs_bucket = self._gcs_client.bucket(GCS_BUCKET)
             logger.info(f"Initialized GCS storage with bucket: {GCS_BUCKET}")
         except ImportError:
@@ -34,15 +80,80 @@ class StateManager:
             logger.error(f"Failed to initialize GCS: {e}")
     
     def load_processed_sessions(self) -> Set[str]:
-        """Load the set of already-processed session IDs."""
+        """Return a copy of the already-processed session IDs, loading them from storage once."""
+        with self._lock:
+            return set(self._ensure_loaded())
+
+    def unprocessed(self, session_ids: Iterable[str]) -> List[str]:
+        """Return the session IDs not yet processed, de-duplicated and in their original order."""
+        with self._lock:
+            sessions = self._ensure_loaded()
+            return [session_id for session_id in dict.fromkeys(session_ids) if session_id not in sessions]
+
+    def processed_count(self) -> int:
+        """Number of processed sessions, including ones not flushed yet."""
+        with self._lock:
+            return len(self._ensure_loaded())
+
+    def _ensure_loaded(self) -> Set[str]:
+        """Load the in-memory session set on first use. Caller holds self._lock."""
+        if self._sessions is None:
+            self._sessions = self._read_processed_sessions()
+        return self._sessions
+
+    @staticmethod
+    def _parse_log(content: str) -> Set[str]:
+        """Parse an append-only log into session IDs."""
+        return {line for line in content.splitlines() if line}
+
+    @staticmethod
+    def _sessions_hash(session_list: list) -> bytes:
+        """Hash a snapshot's sessions, ignoring its timestamp."""
+        return hashlib.md5(json.dumps(session_list, separators=(",", ":")).encode()).digest()
+
+    def _read_gcs_log(self) -> Optional[str]:
+        """Download the GCS log, recording its generation; None if it doesn't exist."""
+        log_blob = self._gcs_bucket.blob(GCS_STATE_LOG_BLOB)
+        try:
+            log = log_blob.download_as_text()
+        except NotFound:
+            self._log_generation = 0
+            return None
+        self._log_generation = log_blob.generation or 0
+        return log
+
+    def _read_gcs_state(self):
+        """
+        Read the snapshot and log from GCS, recording their generations.
+
+        Returns:
+            (snapshot_sessions, logged_sessions), or None if neither exists
+        """
+        snapshot_blob = self._gcs_bucket.blob(GCS_STATE_BLOB)
+        try:
+            snapshot = snapshot_blob.download_as_text()
+            self._snapshot_generation = snapshot_blob.generation or 0
+        except NotFound:
+            snapshot = None
+            self._snapshot_generation = 0
+        log = self._read_gcs_log()
+        if snapshot is None and log is None:
+            return None
+
+        session_list = json.loads(snapshot).get("processed_sessions", []) if snapshot else []
+        self._last_uploaded_hash = self._sessions_hash(session_list) if snapshot else None
+        return set(session_list), self._parse_log(log) if log else set()
+
+    def _read_processed_sessions(self) -> Set[str]:
+        """Read the set of already-processed session IDs from GCS or the local file."""
         # Try GCS first
         if self._gcs_bucket:
             try:
-                blob = self._gcs_bucket.blob(GCS_STATE_BLOB)
-                if blob.exists():
-                    content = blob.download_as_text()
-                    data = json.loads(content)
-                    sessions = set(data.get("processed_sessions", []))
+                state = self._read_gcs_state()
+                if state is not None:
+                    sessions, logged = state
+                    self._snapshot_size, self._log_size = len(sessions), len(logged)
+                    sessions |= logged
                     logger.info(f"Loaded {len(sessions)} processed sessions from GCS")
                     return sessions
             except Exception as e:
@@ -50,23 +161,37 @@ class StateManager:
         
         # Fallback to local file
         try:
+            sessions = set()
             if os.path.exists(self.state_file):
                 with open(self.state_file, "r") as f:
                     data = json.load(f)
                     sessions = set(data.get("processed_sessions", []))
-                    logger.info(f"Loaded {len(sessions)} processed sessions from local file")
-                    return sessions
+            logged = set()
+            if os.path.exists(self.log_file):
+                with open(self.log_file, "r") as f:
+                    logged = self._parse_log(f.read())
+            self._snapshot_size, self._log_size = len(sessions), len(logged)
+            sessions |= logged
+            if sessions:
+                logger.info(f"Loaded {len(sessions)} processed sessions from local file")
+            return sessions
         except Exception as e:
             logger.warning(f"Failed to load state from file: {e}")
         
         return set()
     
+    @staticmethod
+    def _snapshot_data(sessions: Set[str]) -> dict:
+        """Build the JSON snapshot for a set of processed session IDs."""
+        # Sorted so the same sessions always serialize (and hash) the same way
+        return {
+            "processed_sessions": sorted(sessions),
+            "last_updated": datetime.now(timezone.utc).isoformat()
+        }
+
     def save_processed_sessions(self, sessions: Set[str]):
         """Save the set of processed session IDs."""
-        data = {
-            "processed_sessions": list(sessions),
-            "last_updated": __import__('datetime').datetime.utcnow().isoformat()
-        }
+        data = self._snapshot_data(sessions)
         
         # Save to GCS
         if self._gcs_bucket:
@@ -76,27 +201,227 @@ class StateManager:
         self._save_to_file(data)
     
     def _save_to_gcs(self, data: dict):
-        """Save state to Google Cloud Storage."""
-        try:
-            blob = self._gcs_bucket.blob(GCS_STATE_BLOB)
-            blob.upload_from_string(json.dumps(data, indent=2))
+        """
+        Save state to Google Cloud Storage.
+
+        The upload is skipped when the sessions match what was last read or
+        written. Otherwise it only succeeds if the snapshot is still the
+        generation we last saw; if another instance wrote in between, its
+        sessions are merged in and the upload is retried.
+        """
+        blob = self._gcs_bucket.blob(GCS_STATE_BLOB)
+        for _ in range(_GCS_SAVE_ATTEMPTS):
+            content_hash = self._sessions_hash(data["processed_sessions"])
+            if content_hash == self._last_uploaded_hash:
+                logger.debug("State unchanged since the last GCS save, skipping upload")
+                return True
+
+            try:
+                blob.upload_from_string(
+                    json.dumps(data, separators=(",", ":")),
+                    content_type="application/json",
+                    if_generation_match=self._snapshot_generation,
+                )
+            except PreconditionFailed:
+                logger.warning("State in GCS was updated by another writer, merging and retrying")
+                try:
+                    remote, logged = self._read_gcs_state() or (set(), set())
+                except Exception as e:
+                    logger.error(f"Failed to reload state from GCS: {e}")
+                    return False
+                remote |= logged
+                if self._sessions is not None:
+                    self._sessions |= remote
+                data = self._snapshot_data(remote.union(data["processed_sessions"]))
+                continue
+            except Exception as e:
+                logger.error(f"Failed to save state to GCS: {e}")
+                return False
+
+            self._snapshot_generation = blob.generation or 0
+            self._last_uploaded_hash = content_hash
             logger.info(f"Saved state to GCS: {GCS_STATE_BLOB}")
-        except Exception as e:
-            logger.error(f"Failed to save state to GCS: {e}")
+            return True
+
+        logger.error(f"Failed to save state to GCS after {_GCS_SAVE_ATTEMPTS} conflicting writes")
+        return False
     
     def _save_to_file(self, data: dict):
-        """Save state to local file."""
+        """Save state to local file (written to a temp file, then atomically renamed)."""
         try:
             os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
-            with open(self.state_file, "w") as f:
-                json.dump(data, f, indent=2)
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_file, self.state_file)
             logger.info(f"Saved state to file: {self.state_file}")
         except Exception as e:
             logger.error(f"Failed to save state to file: {e}")
     
-    def mark_as_processed(self, session_id: str):
-        """Mark a single session as processed."""
-        sessions = self.load_processed_sessions()
-        sessions.add(session_id)
-        self.save_processed_sessions(sessions)
+    def append_processed(self, session_ids: Iterable[str]):
+        """Append session IDs to the GCS and local logs, one per line."""
+        payload = "".join(f"{session_id}\n" for session_id in session_ids)
+        if not payload:
+            return
+
+        if self._gcs_bucket:
+            self._append_to_gcs(payload)
 
+        # Also append to local file as backup
+        self._append_to_file(payload)
+
+    def _append_to_gcs(self, payload: str):
+        """
+        Append to the GCS log by composing it with a freshly uploaded part.
+
+        The compose only succeeds if the log is still the generation we last
+        saw (or still absent); if another instance appended in between, its
+        sessions are merged in and the append is retried.
+        """
+        part = self._gcs_bucket.blob(f"{GCS_STATE_LOG_BLOB}.{uuid.uuid4().hex}")
+        try:
+            part.upload_from_string(payload, content_type="text/plain")
+            log_blob = self._gcs_bucket.blob(GCS_STATE_LOG_BLOB)
+            log_blob.content_type = "text/plain"
+            for _ in range(_GCS_SAVE_ATTEMPTS):
+                # No log yet (first append since the last compaction): the part becomes the log
+                sources = [log_blob, part] if self._log_generation else [part]
+                try:
+                    log_blob.compose(sources, if_generation_match=self._log_generation)
+                except PreconditionFailed:
+                    logger.warning("State log in GCS was updated by another writer, merging and retrying")
+                    log = self._read_gcs_log()
+                    if log and self._sessions is not None:
+                        self._sessions |= self._parse_log(log)
+                    continue
+                self._log_generation = log_blob.generation or 0
+                logger.info(f"Appended to state log in GCS: {GCS_STATE_LOG_BLOB}")
+                return
+
+            logger.error(f"Failed to append state log to GCS after {_GCS_SAVE_ATTEMPTS} conflicting writes")
+            self._gcs_stale = True
+        except Exception as e:
+            logger.error(f"Failed to append state log to GCS: {e}")
+            self._gcs_stale = True
+        finally:
+            try:
+                part.delete()
+            except Exception:
+                pass
+
+    def _append_to_file(self, payload: str):
+        """Append to the local log file."""
+        try:
+            os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+            with open(self.log_file, "a") as f:
+                f.write(payload)
+            logger.info(f"Appended to state log: {self.log_file}")
+        except Exception as e:
+            logger.error(f"Failed to append state log to file: {e}")
+
+    def compact(self):
+        """Rewrite the snapshot with every processed session and clear the logs."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """compact() body. Caller holds self._lock."""
+        sessions = self._ensure_loaded()
+
+        if self._gcs_bucket:
+            # Retry on the next flush if the log couldn't be folded in
+            self._gcs_stale = not self._compact_gcs(sessions)
+
+        self._save_to_file(self._snapshot_data(sessions))
+        try:
+            if os.path.exists(self.log_file):
+                os.remove(self.log_file)
+        except OSError as e:
+            logger.warning(f"Failed to clear state log file: {e}")
+
+        self._snapshot_size, self._log_size = len(sessions), 0
+        logger.info(f"Compacted state to {len(sessions)} processed sessions")
+
+    def _compact_gcs(self, sessions: Set[str]) -> bool:
+        """
+        Fold the GCS log into the snapshot and delete the log.
+
+        The log is re-read first so entries other instances appended are kept,
+        and the delete only succeeds if the log is still the generation that
+        was read; if someone appended in between, the merge is redone. Adds
+        remote sessions to sessions. Caller holds self._lock.
+
+        Returns:
+            True if the snapshot was saved and the log cleared
+        """
+        log_blob = self._gcs_bucket.blob(GCS_STATE_LOG_BLOB)
+        for _ in range(_GCS_SAVE_ATTEMPTS):
+            try:
+                log = self._read_gcs_log()
+            except Exception as e:
+                logger.error(f"Failed to read state log from GCS: {e}")
+                return False
+            if log:
+                sessions |= self._parse_log(log)
+            log_generation = self._log_generation
+
+            if not self._save_to_gcs(self._snapshot_data(sessions)):
+                return False
+            if not log_generation:
+                return True
+
+            try:
+                log_blob.delete(if_generation_match=log_generation)
+                self._log_generation = 0
+                return True
+            except NotFound:
+                self._log_generation = 0
+                return True
+            except PreconditionFailed:
+                logger.warning("State log in GCS was appended to during compaction, merging and retrying")
+            except Exception as e:
+                # Log entries are already in the snapshot; loading stays correct
+                logger.warning(f"Failed to clear state log in GCS: {e}")
+                return False
+
+        logger.warning("State log in GCS kept changing, leaving it for the next compaction")
+        return False
+
+    def extend(self, session_ids: Iterable[str]):
+        """Record processed sessions in memory; they are persisted by flush()."""
+        with self._lock:
+            sessions = self._ensure_loaded()
+            for session_id in session_ids:
+                if session_id not in sessions:
+                    sessions.add(session_id)
+                    self._unsaved.add(session_id)
+
+    def flush(self, force: bool = False):
+        """
+        Persist sessions added since the last flush.
+
+        Without force, the write only happens once STATE_FLUSH_EVERY_N sessions
+        have been added or STATE_FLUSH_INTERVAL_SECONDS have passed since the
+        last write. New sessions are appended to the log, or folded into a
+        fresh snapshot when the log has grown past twice the snapshot size.
+        """
+        with self._lock:
+            if not self._unsaved:
+                return
+            if not force and (
+                len(self._unsaved) < STATE_FLUSH_EVERY_N
+                and time.monotonic() - self._last_flush < STATE_FLUSH_INTERVAL_SECONDS
+            ):
+                return
+            if self._gcs_stale or self._log_size + len(self._unsaved) > 2 * self._snapshot_size:
+                self._compact()
+            else:
+                self.append_processed(self._unsaved)
+                self._log_size += len(self._unsaved)
+            self._unsaved.clear()
+            self._last_flush = time.monotonic()
+
+    def mark_as_processed(self, session_id: str):
+        """Mark a single session as processed, saving state when a flush is due."""
+        self.extend([session_id])
+        self.flush()
@@ -1,60 +1,157 @@
 """Gemini-powered conversation summarizer for interviews."""
 
-import json
+import asyncio
+import hashlib
 import logging
+import threading
+from concurrent.futures import Executor
 from dataclasses import dataclass
-from typing import Optional, List
+from typing import TYPE_CHECKING, Dict, List, Optional, TypedDict, Union
 
-import google.generativeai as genai
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
 
-from .config import secrets
+from .cache import SummaryCache
+from .clients import get_gemini_rate_limiter
+from .config import (
+    SUMMARY_BATCH_SIZE,
+    SUMMARY_CACHE_PATH,
+    SUMMARY_LIGHT_MAX_CHARS,
+    SUMMARY_LIGHT_MAX_TURNS,
+    SUMMARY_LIGHT_MODEL,
+    SUMMARY_MODEL,
+    secrets,
+)
 from .napster_client import SessionTranscript
+from .rate_limiter import RateLimitExceeded
+from .responses import JsonScanner, parse_json
+
+if TYPE_CHECKING:
+    import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
+# GenerativeModel per model name, shared by every GeminiSummarizer in the process
+_GEMINI_MODEL_CACHE: Dict[str, "genai.GenerativeModel"] = {}
+_GEMINI_MODEL_LOCK = threading.Lock()
+
+
+def _get_gemini_model(model_name: str) -> "genai.GenerativeModel":
+    """Return the shared GenerativeModel for model_name, creating it once."""
+    model = _GEMINI_MODEL_CACHE.get(model_name)
+    if model is None:
+        with _GEMINI_MODEL_LOCK:
+            model = _GEMINI_MODEL_CACHE.get(model_name)
+            if model is None:
+                import google.generativeai as genai
+                model = _GEMINI_MODEL_CACHE[model_name] = genai.GenerativeModel(model_name)
+    return model
+
+
+class EmployeeProfile(TypedDict):
+    role_summary: str
+    key_responsibilities: List[str]
+    tools_and_systems: List[str]
+    pain_points: List[str]
+
+
+class WorkflowAnalysis(TypedDict):
+    identified_workflows: List[str]
+    repetitive_tasks: List[str]
+    manual_processes: List[str]
+    automation_potential: str
+
+
+class ConversationQuality(TypedDict):
+    engagement_level: str
+    depth_of_responses: str
+    total_exchanges: int
+
+
+class SummarySchemaV1(TypedDict):
+    """JSON shape Gemini is constrained to for each conversation summary."""
+    employee_profile: EmployeeProfile
+    workflow_analysis: WorkflowAnalysis
+    conversation_quality: ConversationQuality
+    key_insights: List[str]
+    suggested_actions: List[str]
+    overall_summary: str
+
+
+class BatchSummaryV1(TypedDict):
+    """One entry of a batched response, tagged with the conversation it belongs to."""
+    conversation_number: int
+    summary: SummarySchemaV1
+
+
+# Structured output: Gemini returns raw JSON matching the schema
+_SUMMARY_CONFIG = {"response_mime_type": "application/json", "response_schema": SummarySchemaV1}
+_SUMMARY_BATCH_CONFIG = {"response_mime_type": "application/json", "response_schema": List[BatchSummaryV1]}
+
+# What each field should contain; the JSON shape itself comes from SummarySchemaV1
+_SUMMARY_GUIDE = """- employee_profile: a brief description of the employee's role, the main tasks and responsibilities discussed, software/tools/systems they mentioned using, and frustrations or challenges mentioned
+- workflow_analysis: distinct workflows or processes described, tasks that appear to be done frequently/regularly, tasks that seem highly manual or time-consuming, and automation_potential (high/medium/low)
+- conversation_quality: engagement_level (high/medium/low), depth_of_responses (detailed/moderate/brief), and the total number of exchanges
+- key_insights: insights about their work or processes
+- suggested_actions: recommended follow-ups or improvement opportunities
+- overall_summary: a brief 2-3 sentence summary of the employee's role and the workflows discussed"""
+
 # Employee workflow analysis prompt
 SUMMARY_PROMPT = """You are a workflow analyst helping to understand employee daily tasks and identify opportunities for process improvement.
 
 Analyze this conversation between an AI interviewer and an employee discussing their work responsibilities and daily tasks.
 
-Provide a structured analysis in JSON format:
-
-{{
-  "employee_profile": {{
-    "role_summary": "Brief description of the employee's role",
-    "key_responsibilities": ["Main tasks and responsibilities discussed"],
-    "tools_and_systems": ["Software, tools, or systems they mentioned using"],
-    "pain_points": ["Frustrations or challenges mentioned"]
-  }},
-  "workflow_analysis": {{
-    "identified_workflows": ["List of distinct workflows or processes described"],
-    "repetitive_tasks": ["Tasks that appear to be done frequently/regularly"],
-    "manual_processes": ["Tasks that seem highly manual or time-consuming"],
-    "automation_potential": "high/medium/low"
-  }},
-  "conversation_quality": {{
-    "engagement_level": "high/medium/low",
-    "depth_of_responses": "detailed/moderate/brief",
-    "total_exchanges": <number>
-  }},
-  "key_insights": [
-    "Insight about their work or processes",
-    "Another insight"
-  ],
-  "suggested_actions": [
-    "Recommended follow-up or improvement opportunity"
-  ],
-  "overall_summary": "A brief 2-3 sentence summary of the employee's role and the workflows discussed"
-}}
+Provide a structured analysis:
+
+""" + _SUMMARY_GUIDE + """
 
 CONVERSATION:
 {conversation}
+"""
 
-Return ONLY valid JSON. No markdown, no code blocks, just the JSON object.
+# Same analysis for several conversations in one request
+SUMMARY_BATCH_PROMPT = """You are a workflow analyst helping to understand employee daily tasks and identify opportunities for process improvement.
+
+Analyze each of the {count} conversations below. Each is between an AI interviewer and an employee discussing their work responsibilities and daily tasks.
+
+Return exactly {count} entries, one per conversation. Set conversation_number to the number in the conversation's heading, and put its structured analysis in summary:
+
+""" + _SUMMARY_GUIDE + """
+
+{conversations}
 """
 
 
-@dataclass
+# Part of every summary cache scope, so editing the prompts or bumping the
+# schema stops older cached summaries from being served
+_CACHE_VERSION = hashlib.sha256(
+    "\0".join([SummarySchemaV1.__name__, SUMMARY_PROMPT, SUMMARY_BATCH_PROMPT]).encode()
+).hexdigest()[:16]
+
+
+class SummarySchema(BaseModel):
+    """Validated Gemini summary; missing fields fall back to empty values."""
+    model_config = ConfigDict(extra="ignore")
+
+    employee_profile: dict = {}
+    workflow_analysis: dict = {}
+    conversation_quality: dict = {}
+    key_insights: list = []
+    suggested_actions: list = []
+    overall_summary: str = ""
+
+
+class BatchSummary(BaseModel):
+    """Validated entry of a batched Gemini response."""
+    model_config = ConfigDict(extra="ignore")
+
+    conversation_number: int
+    summary: SummarySchema
+
+
+_SUMMARY_LIST = TypeAdapter(List[BatchSummary])
+
+
+@dataclass(slots=True)
 class ConversationSummary:
     """Structured summary of an employee workflow interview."""
     session_id: str
@@ -64,7 +161,11 @@ class ConversationSummary:
     key_insights: List[str]
     suggested_actions: List[str]
     overall_summary: str
-    raw_json: dict
+
+    @property
+    def raw_json(self) -> dict:
+        """The summary as a plain dict; built on demand rather than stored twice."""
+        return self.to_dict()
 
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization."""
@@ -89,68 +190,309 @@ class GeminiSummarizer:
         if not api_key:
             raise ValueError("Gemini API key is required. Set GEMINI_API_KEY env var or configure Secret Manager.")
 
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        logger.info("Initialized Gemini summarizer with gemini-2.5-flash")
+        # Imported here rather than at module load: the SDK is heavy and only
+        # needed once a summarizer is actually created
+        import google.generativeai as genai
+        self._genai = genai
+        self._genai.configure(api_key=api_key)
+        self.model = _get_gemini_model(SUMMARY_MODEL)
+        logger.info(f"Initialized Gemini summarizer with {SUMMARY_MODEL} (light model: {SUMMARY_LIGHT_MODEL or 'disabled'})")
 
-    def summarize(self, transcript: SessionTranscript) -> Optional[ConversationSummary]:
-        """
-        Summarize a conversation transcript using Gemini AI.
-        
-        Args:
-            transcript: The session transcript to summarize
-            
-        Returns:
-            ConversationSummary object or None if summarization fails
-        """
-        if not transcript.has_meaningful_content():
-            logger.warning(f"Skipping summary for session {transcript.session_id[:20]}... - insufficient content")
-            return None
+        # Shared with every other Gemini caller in the process
+        self.rate_limiter = get_gemini_rate_limiter()
+
+        # Summaries are cached by conversation so re-runs and retries skip Gemini
+        self.cache = None
+        if SUMMARY_CACHE_PATH:
+            try:
+                self.cache = SummaryCache()
+            except Exception as e:
+                logger.warning(f"Failed to open summary cache, continuing without it: {e}")
+
+    @staticmethod
+    def _route_model(transcript: SessionTranscript, conversation_text: str) -> str:
+        """Pick the light model for short, simple transcripts and the full model otherwise."""
+        if (
+            SUMMARY_LIGHT_MODEL
+            and len(conversation_text) < SUMMARY_LIGHT_MAX_CHARS
+            and len(transcript.texts) <= SUMMARY_LIGHT_MAX_TURNS
+        ):
+            return SUMMARY_LIGHT_MODEL
+        return SUMMARY_MODEL
+
+    @staticmethod
+    def _build_summary(session_id: str, parsed: SummarySchema) -> ConversationSummary:
+        """Build a ConversationSummary from a validated Gemini summary."""
+        return ConversationSummary(session_id=session_id, **parsed.model_dump())
 
-        conversation_text = transcript.to_conversation_text()
-        prompt = SUMMARY_PROMPT.format(conversation=conversation_text)
+    @staticmethod
+    def _cache_scope(model_name: str) -> str:
+        """Cache scope for summaries produced by model_name with the current prompts."""
+        return f"{model_name}:{_CACHE_VERSION}"
 
+    def _get_cached(self, transcript: SessionTranscript, conversation_text: str, model_name: str) -> Optional[SummarySchema]:
+        """Look up a cached summary, treating cache errors as misses."""
+        if not self.cache:
+            return None
         try:
-            response = self.model.generate_content(prompt)
-            response_text = response.text.strip()
-
-            # Clean up response - remove markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("\n", 1)[1]
-            if response_text.endswith("```"):
-                response_text = response_text.rsplit("```", 1)[0]
-            response_text = response_text.strip()
-
-            # Parse JSON response
-            data = json.loads(response_text)
-
-            # Extract fields with defaults
-            employee_profile = data.get("employee_profile", {})
-            workflow_analysis = data.get("workflow_analysis", {})
-            conversation_quality = data.get("conversation_quality", {})
-            key_insights = data.get("key_insights", [])
-            suggested_actions = data.get("suggested_actions", [])
-            overall_summary = data.get("overall_summary", "")
-
-            summary = ConversationSummary(
-                session_id=transcript.session_id,
-                employee_profile=employee_profile,
-                workflow_analysis=workflow_analysis,
-                conversation_quality=conversation_quality,
-                key_insights=key_insights,
-                suggested_actions=suggested_actions,
-                overall_summary=overall_summary,
-                raw_json=data,
+            data = self.cache.get(conversation_text, transcript.to_user_text(), self._cache_scope(model_name))
+            return SummarySchema.model_validate(data) if data is not None else None
+        except Exception as e:
+            logger.warning(f"Summary cache lookup failed: {e}")
+            return None
+
+    def _put_cached(self, transcript: SessionTranscript, conversation_text: str, model_name: str, parsed: SummarySchema):
+        """Store a summary in the cache, if enabled."""
+        if not self.cache:
+            return
+        try:
+            self.cache.put(
+                conversation_text, transcript.to_user_text(), self._cache_scope(model_name), parsed.model_dump()
             )
+        except Exception as e:
+            logger.warning(f"Failed to cache summary: {e}")
 
-            logger.info(f"Successfully summarized session {transcript.session_id[:20]}...")
-            return summary
+    def _parse_one(self, response_text: str) -> Optional[SummarySchema]:
+        """Parse a single-conversation Gemini response."""
+        try:
+            return SummarySchema.model_validate_json(response_text)
+        except ValidationError:
+            pass
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Gemini response as JSON: {e}")
+        # Not clean JSON (or not the expected shape); try recovering it
+        try:
+            return SummarySchema.model_validate(parse_json(response_text))
+        except ValueError as e:
+            logger.error(f"Failed to parse Gemini response as a summary: {e}")
             logger.debug(f"Response text: {response_text[:500]}")
             return None
+
+    @staticmethod
+    def _batch_prompt(conversation_texts: List[str]) -> str:
+        """Build the prompt for summarizing several conversations at once."""
+        conversations = "\n\n".join(
+            f"CONVERSATION {number}:\n{text}"
+            for number, text in enumerate(conversation_texts, start=1)
+        )
+        return SUMMARY_BATCH_PROMPT.format(count=len(conversation_texts), conversations=conversations)
+
+    def _parse_many(self, response_text: str, count: int) -> Optional[List[SummarySchema]]:
+        """
+        Parse a batched Gemini response.
+
+        Entries are matched to conversations by conversation_number, not by
+        position, so a reordered response can't attach a summary to the
+        wrong session.
+
+        Returns:
+            One validated summary per conversation, in input order, or None
+            if the response can't be mapped back to the inputs
+        """
+        try:
+            data = _SUMMARY_LIST.validate_json(response_text)
+        except ValidationError:
+            try:
+                data = _SUMMARY_LIST.validate_python(parse_json(response_text))
+            except ValueError as e:
+                logger.warning(f"Failed to parse batch summary response, falling back to one request per conversation: {e}")
+                return None
+
+        by_number = {entry.conversation_number: entry.summary for entry in data}
+        if len(data) != count or by_number.keys() != set(range(1, count + 1)):
+            logger.warning("Batch summary response doesn't match its inputs, falling back to one request per conversation")
+            return None
+        return [by_number[number] for number in range(1, count + 1)]
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Text of a streamed chunk; chunks carrying only metadata have none."""
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+
+    async def _stream_json(self, model_name: str, prompt: str, generation_config: dict, priority: int) -> str:
+        """Stream a Gemini response, stopping as soon as its top-level JSON closes."""
+        await self.rate_limiter.acquire(self.rate_limiter.estimate_tokens(prompt), priority)
+        scanner = JsonScanner()
+        stream = await _get_gemini_model(model_name).generate_content_async(
+            prompt, generation_config=generation_config, stream=True
+        )
+        async for chunk in stream:
+            if scanner.feed(self._chunk_text(chunk)):
+                break
+        # An unfinished document is returned as-is for parse_json to recover
+        return scanner.document() or "".join(scanner.text_parts)
+
+    async def _generate_one(self, model_name: str, conversation_text: str, priority: int = 0) -> Optional[SummarySchema]:
+        """Summarize one conversation with Gemini, returning the validated summary."""
+        try:
+            response_text = await self._stream_json(
+                model_name, SUMMARY_PROMPT.format(conversation=conversation_text), _SUMMARY_CONFIG, priority
+            )
+            return self._parse_one(response_text)
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             logger.error(f"Failed to summarize conversation: {e}")
             return None
 
+    async def _generate_many(self, model_name: str, conversation_texts: List[str], priority: int = 0) -> Optional[List[SummarySchema]]:
+        """Summarize several conversations with a single Gemini request."""
+        try:
+            response_text = await self._stream_json(
+                model_name, self._batch_prompt(conversation_texts), _SUMMARY_BATCH_CONFIG, priority
+            )
+            return self._parse_many(response_text, len(conversation_texts))
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Batch summarization failed, falling back to one request per conversation: {e}")
+            return None
+
+    def _prepare_batch(self, transcripts: List[SessionTranscript]):
+        """
+        Skip empty conversations and serve what we can from the cache.
+
+        Returns:
+            (results, pending): per-transcript results filled in from the
+            cache, and (index, conversation_text, model_name) tuples still
+            to summarize
+        """
+        results: List[Optional[ConversationSummary]] = [None] * len(transcripts)
+        pending = []
+        for index, transcript in enumerate(transcripts):
+            if not transcript.has_meaningful_content():
+                logger.warning(f"Skipping summary for session {transcript.session_id[:20]}... - insufficient content")
+                continue
+
+            conversation_text = transcript.to_conversation_text()
+            model_name = self._route_model(transcript, conversation_text)
+            cached = self._get_cached(transcript, conversation_text, model_name)
+            if cached is not None:
+                results[index] = self._build_summary(transcript.session_id, cached)
+            else:
+                pending.append((index, conversation_text, model_name))
+        return results, pending
+
+    @staticmethod
+    def _split_batches(pending: list):
+        """Group pending work by routed model, SUMMARY_BATCH_SIZE per request."""
+        by_model = {}
+        for item in pending:
+            by_model.setdefault(item[2], []).append(item)
+        for model_name, items in by_model.items():
+            for start in range(0, len(items), SUMMARY_BATCH_SIZE):
+                yield model_name, items[start:start + SUMMARY_BATCH_SIZE]
+
+    def _collect_batch(self, transcripts, results, batch, batch_data):
+        """Store generated summaries in results and the cache, and RateLimitExceeded for deferred ones."""
+        for (index, conversation_text, model_name), parsed in zip(batch, batch_data):
+            if isinstance(parsed, RateLimitExceeded):
+                results[index] = parsed
+                continue
+            if parsed is None:
+                continue
+            session_id = transcripts[index].session_id
+            results[index] = self._build_summary(session_id, parsed)
+            self._put_cached(transcripts[index], conversation_text, model_name, parsed)
+            logger.info(f"Successfully summarized session {session_id[:20]}...")
+
+    def summarize_batch(
+        self,
+        transcripts: List[SessionTranscript],
+        priority: int = 0
+    ) -> List[Union[ConversationSummary, RateLimitExceeded, None]]:
+        """Blocking wrapper around summarize_batch_async, for callers outside an event loop."""
+        return asyncio.run(self.summarize_batch_async(transcripts, priority))
+
+    async def summarize_batch_async(
+        self,
+        transcripts: List[SessionTranscript],
+        priority: int = 0,
+        executor: Optional[Executor] = None
+    ) -> List[Union[ConversationSummary, RateLimitExceeded, None]]:
+        """
+        Summarize several conversation transcripts, SUMMARY_BATCH_SIZE per Gemini request.
+
+        Short, simple transcripts are routed to SUMMARY_LIGHT_MODEL and batched
+        separately from the rest. Requests within the call run one after
+        another; callers bound overall concurrency across calls. When a batched
+        response can't be used, the per-conversation fallback requests are
+        issued concurrently. Cache reads and writes (SQLite, and embedding when
+        the semantic cache is on) run on the executor to keep the event loop
+        free.
+
+        Throttling doesn't fail the whole call: conversations that couldn't
+        get Gemini capacity get the RateLimitExceeded in their slot, and
+        summaries that did complete (or came from the cache) are kept.
+
+        Args:
+            transcripts: The session transcripts to summarize
+            priority: Rate limiter priority; lower values are admitted first.
+                Per-conversation retries of a failed batch run one step ahead.
+            executor: Thread pool for cache I/O (default: the loop's)
+
+        Returns:
+            Per transcript, in order: a ConversationSummary, None if
+            summarization failed, or RateLimitExceeded if it was deferred
+        """
+        loop = asyncio.get_running_loop()
+        results, pending = await loop.run_in_executor(executor, self._prepare_batch, transcripts)
+        throttled: Optional[RateLimitExceeded] = None
+
+        for model_name, batch in self._split_batches(pending):
+            conversation_texts = [text for _, text, _ in batch]
+
+            if throttled is not None:
+                # Already out of capacity; don't wait out the limit again per group
+                await loop.run_in_executor(
+                    executor, self._collect_batch, transcripts, results, batch, [throttled] * len(batch)
+                )
+                continue
+
+            try:
+                batch_data = (
+                    await self._generate_many(model_name, conversation_texts, priority)
+                    if len(batch) > 1 else None
+                )
+            except RateLimitExceeded as e:
+                throttled = e
+                batch_data = [e] * len(batch)
+            if batch_data is None:
+                batch_data = await asyncio.gather(
+                    *(self._generate_one(model_name, text, priority - 1) for text in conversation_texts),
+                    return_exceptions=True
+                )
+                for item in batch_data:
+                    if isinstance(item, RateLimitExceeded):
+                        throttled = item
+                    elif isinstance(item, BaseException):
+                        raise item
+
+            await loop.run_in_executor(executor, self._collect_batch, transcripts, results, batch, batch_data)
+
+        return results
+
+    def summarize(self, transcript: SessionTranscript, priority: int = 0) -> Optional[ConversationSummary]:
+        """
+        Summarize a conversation transcript using Gemini AI.
+        
+        Args:
+            transcript: The session transcript to summarize
+            priority: Rate limiter priority; lower values are admitted first
+            
+        Returns:
+            ConversationSummary object or None if summarization fails
+
+        Raises:
+            RateLimitExceeded: if Gemini capacity isn't available in time
+        """
+        return asyncio.run(self.summarize_async(transcript, priority))
+
+    async def summarize_async(self, transcript: SessionTranscript, priority: int = 0) -> Optional[ConversationSummary]:
+        """Async variant of summarize; raises RateLimitExceeded if Gemini capacity isn't available in time."""
+        result = (await self.summarize_batch_async([transcript], priority))[0]
+        if isinstance(result, RateLimitExceeded):
+            raise result
+        return result